@@ -1,8 +1,9 @@
 import os
 from dotenv import load_dotenv
-from agno.agent import Agent
-from agno.models.google import Gemini
-from agno.tools.pubmed import PubmedTools
+from pubmed_dedup import DedupPubmedTools
+from model_router import ModelRouter
+from session_memory import SessionMemoryTools, SessionStore
+from run_context import RunScopedAgent
 from agno.playground import Playground
 from agent_knowledge import knowledge_base
 
@@ -129,9 +130,12 @@ Analyze the user's query to determine appropriate response depth:
 - Analyze the user's query to identify specific Ayurvedic herbs, formulations, practices, and health conditions.
 - Construct comprehensive search queries using both common and scientific names (e.g., "ashwagandha OR withania somnifera").
 - Use the provided keyword reference as needed: {ayurvedic_keywords}
+- Call `expand_keywords` with the user's question to get ready-made PubMed queries, then add or adjust queries as needed.
 
 ## STEP 3: EXECUTE APPROPRIATE SEARCH DEPTH
 - **CRITICAL**: You MUST use the `search_pubmed` tool to find relevant scientific papers. Never provide a response without executing a search.
+- Pass all of your keyword combinations to `search_pubmed` in a single call. Results come back as de-duplicated studies; PMIDs listed under "related_pmids" (errata, comments, duplicate publications) belong to the same study and must not be counted or summarized separately. Each study carries a short "summary" of its abstract; base your synthesis on it. Studies marked "returned_earlier" were already given to you in full by an earlier call in this run.
+- **For follow-up questions** in the same conversation (e.g., "what about dosage?"), call `recall_session_papers` first and reuse the studies you already retrieved. Only call `search_pubmed` for aspects those studies do not cover; studies marked "already_retrieved" are in your session memory.
 - **For Simple Queries**: Retrieve 5-15 papers focusing on most recent and authoritative
 - **For Moderate Queries**: Retrieve 15-30 papers with balanced coverage
 - **For Complex Queries**: Aim to retrieve 20-50+ papers initially to ensure thorough review
@@ -139,6 +143,7 @@ Analyze the user's query to determine appropriate response depth:
 ## STEP 4: INTERNAL SYNTHESIS & ANALYSIS
 - From the search results, internally filter and analyze the most relevant papers.
 - Prioritize human clinical trials, systematic reviews, and recent studies (last 10 years), but include landmark older studies if important.
+- Studies arrive ranked by their precomputed `evidence` record (design, population, sample size, year, score, grade). Use these stored values for prioritization and study design/sample size instead of re-deriving them.
 - For each key paper, internally extract its study design, sample size, dosages, outcomes, and safety data.
 - *IMPORTANT*: Do NOT output this raw data or any intermediate JSON. This analysis is for your internal use only to build the final response.
 
@@ -161,11 +166,11 @@ Analyze the user's query to determine appropriate response depth:
 
 ## Executive Summary
 - A direct answer to the user's question.
-- The overall state of research (e.g., robust, emerging, limited).
+- The overall state of research (e.g., robust, emerging, limited), as given by `evidence_overview.state_of_research`.
 - Key clinical recommendations based on the evidence.
 
 ## Research Overview
-- A brief summary of the types and quality of studies you analyzed.
+- A brief summary of the types and quality of studies you analyzed, taken from the `evidence_overview` returned by `search_pubmed`.
 
 ## Key Findings
 ### Clinical Efficacy
@@ -410,12 +415,26 @@ Your final output must ONLY be the complete markdown report. Do not include your
 ]
 
 
-ayurvedic_assistant = Agent(
+# Routes each sub-task to the cheapest adequate Gemini tier, failing over on 503s and timeouts
+model_router = ModelRouter(api_key=os.getenv('GOOGLE_API_KEY'))
+
+# Papers retrieved per Playground session, so follow-up turns don't search or replay history again
+session_store = SessionStore(max_sessions=100, ttl=3600)
+
+# The Playground shares this agent between all sessions; each run binds its own session for the tools
+ayurvedic_assistant = RunScopedAgent(
     name="Ayurvedic Research Assistant",
     # Use a powerful model capable of complex, multi-step reasoning
-    model=Gemini(id='gemini-2.5-pro', api_key=os.getenv('GOOGLE_API_KEY')),
+    model=model_router.for_task("synthesis"),
     description='A comprehensive assistant that searches PubMed, synthesizes Ayurvedic research, and generates detailed reports.',
-    tools=[PubmedTools(results_expanded=True)],
+    tools=[
+        DedupPubmedTools(
+            session_store=session_store,
+            keyword_model=model_router.for_task("keyword_expansion"),
+            summary_model=model_router.for_task("paper_summary"),
+        ),
+        SessionMemoryTools(session_store),
+    ],
     knowledge=knowledge_base,
     search_knowledge=True,
     instructions=consolidated_instructions,
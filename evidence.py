@@ -0,0 +1,163 @@
+import math
+import re
+from collections import Counter
+from datetime import date
+from typing import Dict, Iterable, List, Optional
+
+# Study design weights keyed by PubMed publication type, strongest evidence first.
+# A record takes the weight of its strongest listed type.
+DESIGN_WEIGHTS = {
+    "Meta-Analysis": ("meta-analysis", 1.0),
+    "Systematic Review": ("systematic review", 0.95),
+    "Randomized Controlled Trial": ("randomized controlled trial", 0.85),
+    "Clinical Trial, Phase IV": ("clinical trial", 0.8),
+    "Clinical Trial, Phase III": ("clinical trial", 0.8),
+    "Controlled Clinical Trial": ("clinical trial", 0.75),
+    "Pragmatic Clinical Trial": ("clinical trial", 0.75),
+    "Clinical Trial, Phase II": ("clinical trial", 0.7),
+    "Clinical Trial": ("clinical trial", 0.7),
+    "Clinical Trial, Phase I": ("clinical trial", 0.6),
+    "Multicenter Study": ("observational study", 0.55),
+    "Observational Study": ("observational study", 0.5),
+    "Comparative Study": ("observational study", 0.45),
+    "Review": ("narrative review", 0.35),
+    "Case Reports": ("case report", 0.25),
+}
+DEFAULT_DESIGN = ("other", 0.3)
+
+# Multipliers applied from the MeSH check tags Humans/Animals
+POPULATION_WEIGHTS = {"human": 1.0, "unspecified": 0.7, "animal": 0.4}
+
+PARTICIPANT_WORDS = (
+    r"patients|participants|subjects|adults|volunteers|children|women|men|"
+    r"individuals|cases|infants|students|elderly|persons|people"
+)
+RECRUITMENT_WORDS = r"randomi[sz]ed|enrolled|recruited|included"
+# A count, unless it is a dose, a duration or another measurement ("500 mg", "12 weeks")
+NUMBER = (
+    r"(\d{1,3}(?:,\d{3})+|\d+)(?!\d|[.,]\d)(?!\s*(?:%|percent|[mµu]?g|kg|mcg|ng|ml|l|iu|mmol|"
+    r"weeks?|days?|months?|years?|hours?|hrs?|h|min(?:utes)?|times|doses?|sessions?|capsules?|tablets?)\b)"
+)
+# Gaps between a count and its noun may only hold words, never other numbers
+WORD_GAP = r"(?:[a-z][a-z-]*\s+){0,3}?"
+# Patterns in order of reliability; the first one that matches decides the sample size
+SAMPLE_SIZE_PATTERNS = [
+    re.compile(r"\b[nN]\s*=\s*" + NUMBER + r"(?!\s+(?:per|each|in\s+each)\b)"),
+    re.compile(rf"\b(?:{RECRUITMENT_WORDS})\s+(?:a\s+total\s+of\s+)?{NUMBER}", re.IGNORECASE),
+    re.compile(rf"\b{NUMBER}\s+{WORD_GAP}(?:were|was)\s+(?:{RECRUITMENT_WORDS})\b", re.IGNORECASE),
+    re.compile(rf"\b{NUMBER}\s+{WORD_GAP}(?:{PARTICIPANT_WORDS})\b", re.IGNORECASE),
+]
+# Years read as counts only after these words ("in 2019 patients were ...")
+YEAR_PREFIX = re.compile(r"\b(?:in|since|from|during|between|until)\s+$", re.IGNORECASE)
+MAX_PLAUSIBLE_SAMPLE = 1_000_000
+
+RECENT_YEARS = 10
+
+
+def extract_sample_size(abstract: str) -> Optional[int]:
+    """Return the participant count of an abstract from its most reliable mention.
+
+    ``n =`` counts win over recruitment counts ("randomized 60 adults"), which win
+    over a number followed by a participant noun. Within one pattern the largest
+    count is taken, since per-arm counts are smaller than the total.
+    """
+    abstract = abstract or ""
+    for pattern in SAMPLE_SIZE_PATTERNS:
+        sizes = []
+        for match in pattern.finditer(abstract):
+            value = int(match.group(1).replace(",", ""))
+            if 1900 <= value <= 2100 and YEAR_PREFIX.search(abstract[:match.start(1)]):
+                continue
+            if 0 < value < MAX_PLAUSIBLE_SAMPLE:
+                sizes.append(value)
+        if sizes:
+            return max(sizes)
+    return None
+
+
+def classify_design(publication_types: Iterable[str]) -> tuple:
+    matches = [DESIGN_WEIGHTS[p] for p in publication_types if p in DESIGN_WEIGHTS]
+    return max(matches, key=lambda design: design[1]) if matches else DEFAULT_DESIGN
+
+
+def classify_population(mesh_terms: Iterable[str]) -> str:
+    mesh_terms = set(mesh_terms)
+    if "Humans" in mesh_terms:
+        return "human"
+    if "Animals" in mesh_terms:
+        return "animal"
+    return "unspecified"
+
+
+def grade_for(score: float) -> str:
+    if score >= 70:
+        return "high"
+    if score >= 45:
+        return "moderate"
+    if score >= 25:
+        return "low"
+    return "very low"
+
+
+def score_corpus(records: List[dict], current_year: Optional[int] = None) -> List[dict]:
+    """Compute an evidence record for every paper in one pass over the corpus.
+
+    Each returned dict has the study design, population, extracted sample size,
+    publication year, a 0-100 score and a grade. The score multiplies the design
+    and population weights, then scales by sample size (log, saturating at
+    ~1000 participants) and recency (full credit within RECENT_YEARS).
+    """
+    current_year = current_year or date.today().year
+    evidence = []
+    for record in records:
+        design, design_weight = classify_design(record.get("publication_types", []))
+        population = classify_population(record.get("mesh_terms", []))
+        sample_size = extract_sample_size(record.get("abstract", ""))
+        year = record.get("year")
+
+        sample_factor = min(1.0, math.log10(sample_size + 1) / 3) if sample_size else 0.0
+        age = current_year - year if year else RECENT_YEARS * 2
+        recency_factor = 1.0 if age <= RECENT_YEARS else max(0.0, 1 - (age - RECENT_YEARS) / (RECENT_YEARS * 2))
+
+        score = 100 * design_weight * POPULATION_WEIGHTS[population]
+        score *= (0.7 + 0.3 * sample_factor) * (0.8 + 0.2 * recency_factor)
+        evidence.append({
+            "design": design,
+            "population": population,
+            "sample_size": sample_size,
+            "year": year,
+            "score": round(score, 1),
+            "grade": grade_for(score),
+        })
+    return evidence
+
+
+def summarize_evidence(evidence: List[dict]) -> Dict[str, object]:
+    """Aggregate evidence records into the numbers behind a Research Overview."""
+    if not evidence:
+        return {"total_studies": 0, "state_of_research": "limited"}
+    designs = Counter(e["design"] for e in evidence)
+    grades = Counter(e["grade"] for e in evidence)
+    human_trials = sum(
+        1 for e in evidence
+        if e["population"] == "human" and e["design"] in ("randomized controlled trial", "clinical trial")
+    )
+    syntheses = designs["meta-analysis"] + designs["systematic review"]
+    if (syntheses and human_trials >= 3) or human_trials >= 5:
+        state = "robust"
+    elif human_trials or grades["high"] + grades["moderate"] >= 3:
+        state = "emerging"
+    else:
+        state = "limited"
+    years = [e["year"] for e in evidence if e["year"]]
+    return {
+        "total_studies": len(evidence),
+        "state_of_research": state,
+        "human_clinical_trials": human_trials,
+        "systematic_reviews_and_meta_analyses": syntheses,
+        "animal_studies": sum(1 for e in evidence if e["population"] == "animal"),
+        "study_designs": dict(designs.most_common()),
+        "grades": dict(grades.most_common()),
+        "year_range": [min(years), max(years)] if years else None,
+        "total_participants": sum(e["sample_size"] or 0 for e in evidence),
+    }
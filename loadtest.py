@@ -0,0 +1,456 @@
+"""Memory load test for the Playground (agent.py) and Streamlit (pydanticagent.py) apps.
+
+Simulated users send concurrent queries to the app running in this process, with
+PubMed served by a local stand-in and Gemini replaced by the router's MockModel
+tiers. RSS is sampled over time, tracemalloc diffs record the top allocators per
+profiled request, and a run is flagged as leaking when RSS keeps growing after
+warm-up.
+
+agent.py imports ``agent_knowledge``, which is not part of the repository; when it
+cannot be imported the Playground runs without a knowledge base, so its retrieval
+memory is not measured. The Streamlit target runs one script at a time, so its
+latencies exclude the time spent waiting for another session's run.
+
+    python loadtest.py playground --users 8 --requests 25
+    python loadtest.py streamlit --users 4 --requests 10 --report streamlit.json
+
+The exit code is 1 when a leak is flagged or a Playground session holds another
+session's papers, so the script can gate CI.
+"""
+import argparse
+import asyncio
+import gc
+import hashlib
+import importlib.util
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import types
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+QUERIES = [
+    "ashwagandha anxiety", "triphala digestion", "turmeric inflammation", "brahmi memory",
+    "panchakarma detoxification", "tulsi stress", "guduchi immunity", "shatavari lactation",
+]
+FOLLOW_UPS = ["what about dosage?", "is it safe in pregnancy?", "any side effects?"]
+
+
+PAPERS_PER_QUERY = 15
+
+
+def fake_pmids(term: str) -> List[str]:
+    """PMIDs the fake PubMed returns for a search term."""
+    seed = int(hashlib.md5(term.encode()).hexdigest()[:6], 16) % 5000
+    # Neighbouring queries overlap so de-duplication has work to do
+    return [str(30000000 + seed + i) for i in range(PAPERS_PER_QUERY)]
+
+
+class FakePubmedHandler(BaseHTTPRequestHandler):
+    """Answers esearch/efetch with deterministic synthetic records."""
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, body: str, content_type: str) -> None:
+        payload = body.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        if url.path.endswith("esearch.fcgi"):
+            ids = fake_pmids(params.get("term", [""])[0])
+            self._send(json.dumps({"esearchresult": {"idlist": ids}}), "application/json")
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        if not urlparse(self.path).path.endswith("efetch.fcgi"):
+            self.send_error(404)
+            return
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode()
+        pmids = parse_qs(body).get("id", [""])[0].split(",")
+        articles = "".join(
+            f"""<PubmedArticle><MedlineCitation><PMID>{pmid}</PMID><Article>
+<Journal><Title>Journal of Ayurveda</Title><JournalIssue><PubDate><Year>{2005 + int(pmid) % 20}</Year></PubDate></JournalIssue></Journal>
+<ArticleTitle>Synthetic study {pmid} of an Ayurvedic intervention</ArticleTitle>
+<Abstract><AbstractText>We randomized {20 + int(pmid) % 300} adults. {"Outcome text. " * 40}</AbstractText></Abstract>
+<AuthorList><Author><LastName>Author{pmid}</LastName><Initials>A</Initials></Author></AuthorList>
+<PublicationTypeList><PublicationType>{"Randomized Controlled Trial" if int(pmid) % 3 else "Review"}</PublicationType></PublicationTypeList>
+</Article><MeshHeadingList><MeshHeading><DescriptorName>Humans</DescriptorName></MeshHeading></MeshHeadingList>
+</MedlineCitation></PubmedArticle>"""
+            for pmid in pmids if pmid
+        )
+        self._send(f"<PubmedArticleSet>{articles}</PubmedArticleSet>", "text/xml")
+
+
+def start_fake_pubmed() -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakePubmedHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def install_mock_models(latency: float) -> None:
+    """Make every ModelRouter the apps create use MockModel tiers; call before importing them."""
+    import model_router
+
+    def mock_factory(model_id: str) -> model_router.Model:
+        return model_router.MockModel(
+            id=model_id,
+            latency=latency,
+            tool_call="search_pubmed",
+            tool_arguments=lambda message: {"queries": [message]},
+        )
+
+    class MockRouter(model_router.ModelRouter):
+        def __init__(self, *args, model_factory=None, **kwargs):
+            super().__init__(*args, model_factory=model_factory or mock_factory, **kwargs)
+
+    model_router.ModelRouter = MockRouter
+
+
+def install_knowledge_stub() -> None:
+    """Stand in for the agent_knowledge module agent.py imports, when it is not available."""
+    if importlib.util.find_spec("agent_knowledge") is not None:
+        return
+    print("agent_knowledge not found: running the Playground without a knowledge base", file=sys.stderr)
+    module = types.ModuleType("agent_knowledge")
+    module.knowledge_base = None
+    sys.modules["agent_knowledge"] = module
+
+
+def current_rss() -> int:
+    """Resident set size of this process in bytes."""
+    try:
+        import psutil
+
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+
+        # Peak rather than current RSS, the closest portable fallback
+        scale = 1 if sys.platform == "darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+class RssSampler:
+    """Samples RSS on a background thread."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.samples: List[tuple] = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._started = time.monotonic()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.samples.append((round(time.monotonic() - self._started, 3), current_rss()))
+            self._stop.wait(self.interval)
+
+    def __enter__(self) -> "RssSampler":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+@dataclass
+class RequestRecord:
+    user: int
+    index: int
+    query: str
+    seconds: float
+    rss_after: int
+    ok: bool
+    error: Optional[str] = None
+    # Time spent waiting before the request could run, for targets that run one request at a time
+    queued: float = 0.0
+    top_allocators: List[Dict[str, object]] = field(default_factory=list)
+
+
+# Allocations made by the profiler itself and by one-off imports are not interesting
+SNAPSHOT_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+]
+
+
+def take_snapshot() -> tracemalloc.Snapshot:
+    return tracemalloc.take_snapshot().filter_traces(SNAPSHOT_FILTERS)
+
+
+def top_allocators(before: tracemalloc.Snapshot, after: tracemalloc.Snapshot, limit: int) -> List[Dict[str, object]]:
+    return [
+        {"location": str(stat.traceback[0]), "size_diff": stat.size_diff, "count_diff": stat.count_diff}
+        for stat in after.compare_to(before, "lineno")[:limit]
+    ]
+
+
+class LoadTest:
+    """Runs a target's ``send(user, index, query)`` for every simulated user and records memory.
+
+    ``send`` may return the seconds the request itself took, excluding any queueing;
+    otherwise the wall time of the call is used.
+    """
+
+    def __init__(self, args: argparse.Namespace, send: Callable[[int, int, str], Optional[float]], serial: bool = False):
+        self.args = args
+        self.send = send
+        self.serial = serial
+        self.records: List[RequestRecord] = []
+        self._lock = threading.Lock()
+        self._completed = 0
+        self._warmup_requests = int(args.users * args.requests * args.warmup)
+        self._warmup_snapshot: Optional[tracemalloc.Snapshot] = None
+
+    def query_for(self, user: int, index: int) -> str:
+        if index % (len(FOLLOW_UPS) + 1):
+            return FOLLOW_UPS[(index - 1) % len(FOLLOW_UPS)]
+        return QUERIES[(user + index) % len(QUERIES)]
+
+    def run_one(self, user: int, index: int) -> None:
+        query = self.query_for(user, index)
+        with self._lock:
+            self._completed += 1
+            profile = self.args.profile_every and self._completed % self.args.profile_every == 0
+        # Snapshots are process-wide, so diffs include allocations of concurrent requests
+        before = take_snapshot() if profile else None
+        started = time.monotonic()
+        error = None
+        seconds = None
+        try:
+            seconds = self.send(user, index, query)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        elapsed = time.monotonic() - started
+        seconds = elapsed if seconds is None else seconds
+        record = RequestRecord(
+            user, index, query, round(seconds, 3), current_rss(), error is None, error, round(elapsed - seconds, 3)
+        )
+        if before is not None:
+            record.top_allocators = top_allocators(before, take_snapshot(), self.args.top)
+        with self._lock:
+            self.records.append(record)
+            take_warmup_snapshot = len(self.records) == max(1, self._warmup_requests)
+        if take_warmup_snapshot:
+            self._warmup_snapshot = take_snapshot()
+
+    def run_user(self, user: int) -> None:
+        for index in range(self.args.requests):
+            self.run_one(user, index)
+
+    def run(self) -> dict:
+        tracemalloc.start(self.args.frames)
+        with RssSampler(self.args.sample_interval) as sampler:
+            with ThreadPoolExecutor(max_workers=self.args.users) as pool:
+                list(pool.map(self.run_user, range(self.args.users)))
+            gc.collect()
+            final_snapshot = take_snapshot()
+        tracemalloc.stop()
+        return self.report(sampler.samples, final_snapshot)
+
+    def report(self, samples: List[tuple], final_snapshot: tracemalloc.Snapshot) -> dict:
+        # Records are appended in completion order
+        ordered = self.records
+        steady = ordered[self._warmup_requests:]
+        slope = rss_slope([record.rss_after for record in steady])
+        growth = steady[-1].rss_after - steady[0].rss_after if len(steady) > 1 else 0
+        leak = slope > self.args.leak_kb_per_request * 1024 and growth > self.args.min_growth_mb * 1024 * 1024
+        latencies = sorted(record.seconds for record in ordered)
+        queued = sorted(record.queued for record in ordered)
+        return {
+            "target": self.args.target,
+            "users": self.args.users,
+            "requests_per_user": self.args.requests,
+            "serial": self.serial,
+            "errors": sum(1 for record in ordered if not record.ok),
+            "latency_p50": latencies[len(latencies) // 2] if latencies else None,
+            "latency_p95": latencies[int(len(latencies) * 0.95)] if latencies else None,
+            "queued_p95": queued[int(len(queued) * 0.95)] if queued else None,
+            "rss_start": samples[0][1] if samples else None,
+            "rss_peak": max(sample[1] for sample in samples) if samples else None,
+            "rss_end": samples[-1][1] if samples else None,
+            "steady_state_growth_bytes": growth,
+            "rss_slope_bytes_per_request": round(slope, 1),
+            "leak_suspected": leak,
+            "top_allocators_end": [
+                {"location": str(stat.traceback[0]), "size": stat.size, "count": stat.count}
+                for stat in final_snapshot.statistics("lineno")[: self.args.top]
+            ],
+            "top_growth_since_warmup": top_allocators(self._warmup_snapshot, final_snapshot, self.args.top)
+            if self._warmup_snapshot is not None else [],
+            "rss_samples": samples,
+            "requests": [asdict(record) for record in ordered],
+        }
+
+
+def rss_slope(values: List[int]) -> float:
+    """Least-squares slope of RSS against request order, in bytes per request."""
+    count = len(values)
+    if count < 2:
+        return 0.0
+    mean_x = (count - 1) / 2
+    mean_y = sum(values) / count
+    covariance = sum((x - mean_x) * (y - mean_y) for x, y in enumerate(values))
+    variance = sum((x - mean_x) ** 2 for x in range(count))
+    return covariance / variance
+
+
+def session_isolation_errors(store, test: LoadTest) -> List[str]:
+    """Check that each ``loadtest-{user}`` session holds only papers and questions from its own queries.
+
+    The mock model searches PubMed for every message, so a session's papers must
+    come from that user's queries and must not be empty.
+    """
+    errors = []
+    for user in range(test.args.users):
+        session_id = f"loadtest-{user}"
+        queries = {test.query_for(user, index) for index in range(test.args.requests)}
+        expected = {pmid for query in queries for pmid in fake_pmids(query)}
+        session = store.get(session_id)
+        if not session.records:
+            errors.append(f"{session_id} holds no papers")
+        foreign = set(session.records) - expected
+        if foreign:
+            errors.append(f"{session_id} holds {len(foreign)} papers from other sessions' queries")
+        foreign_questions = {line.split(" -> ")[0] for line in session.summary} - queries
+        if foreign_questions:
+            errors.append(f"{session_id} recorded other sessions' questions: {sorted(foreign_questions)}")
+    return errors
+
+
+def playground_sender(args: argparse.Namespace) -> Callable[[int, int, str], None]:
+    """Drive agent.py's Playground FastAPI app in-process over ASGI."""
+    import httpx
+
+    import agent
+
+    agent_id = agent.ayurvedic_assistant.agent_id or agent.ayurvedic_assistant.set_agent_id()
+    url = f"http://playground/v1/playground/agents/{agent_id}/runs"
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=agent.app), timeout=args.timeout)
+
+    def send(user: int, index: int, query: str) -> None:
+        data = {"message": query, "stream": "false", "session_id": f"loadtest-{user}", "user_id": f"user-{user}"}
+        response = asyncio.run_coroutine_threadsafe(client.post(url, data=data), loop).result(args.timeout)
+        response.raise_for_status()
+
+    return send
+
+
+def streamlit_sender(args: argparse.Namespace) -> Callable[[int, int, str], None]:
+    """Drive pydanticagent.py with Streamlit's AppTest; every click reruns the whole script.
+
+    AppTest instances are not safe to run from several threads at once, so user
+    sessions stay separate but their script runs are interleaved one at a time.
+    Each request is timed from when its run starts, without the wait for the lock.
+    """
+    from streamlit.testing.v1 import AppTest
+
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pydanticagent.py")
+    sessions: Dict[int, AppTest] = {}
+    script_lock = threading.Lock()
+
+    def send(user: int, index: int, query: str) -> float:
+        with script_lock:
+            started = time.monotonic()
+            app = sessions.get(user)
+            if app is None:
+                app = sessions[user] = AppTest.from_file(script, default_timeout=args.timeout).run()
+            app.text_input[0].input(query)
+            next(button for button in app.button if button.label.endswith("Search Research")).click()
+            app.run()
+            if app.exception:
+                raise RuntimeError(app.exception[0].message)
+            return time.monotonic() - started
+
+    return send
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("target", choices=["playground", "streamlit"])
+    parser.add_argument("--users", type=int, default=8, help="concurrent simulated users")
+    parser.add_argument("--requests", type=int, default=20, help="requests per user")
+    parser.add_argument("--model-latency", type=float, default=0.05, help="seconds per mock model call")
+    parser.add_argument("--sample-interval", type=float, default=0.5, help="seconds between RSS samples")
+    parser.add_argument("--profile-every", type=int, default=10, help="tracemalloc diff every Nth request, 0 to disable")
+    parser.add_argument("--frames", type=int, default=1, help="traceback frames kept by tracemalloc")
+    parser.add_argument("--top", type=int, default=10, help="allocators listed per profile")
+    parser.add_argument("--warmup", type=float, default=0.2, help="fraction of requests ignored for leak detection")
+    parser.add_argument("--leak-kb-per-request", type=float, default=50.0, help="RSS slope that counts as a leak")
+    parser.add_argument("--min-growth-mb", type=float, default=5.0, help="minimum steady-state growth for a leak")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--report", help="write the full JSON report to this path")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    server = start_fake_pubmed()
+    # Installed before the apps are imported so their tools and router pick the stand-ins up
+    os.environ["PUBMED_EUTILS_URL"] = f"http://127.0.0.1:{server.server_address[1]}"
+    os.environ.setdefault("AGNO_TELEMETRY", "false")
+    install_mock_models(args.model_latency)
+
+    if args.target == "playground":
+        install_knowledge_stub()
+        test = LoadTest(args, playground_sender(args))
+        report = test.run()
+        import agent
+
+        report["session_isolation_errors"] = session_isolation_errors(agent.session_store, test)
+    else:
+        # Each AppTest session runs its own copy of the script, with no shared session store
+        report = LoadTest(args, streamlit_sender(args), serial=True).run()
+        report["session_isolation_errors"] = []
+    server.shutdown()
+
+    if args.report:
+        with open(args.report, "w") as output:
+            json.dump(report, output, indent=2)
+    mb = 1024 * 1024
+    print(f"{args.target}: {args.users} users x {args.requests} requests, {report['errors']} errors")
+    print(f"latency p50={report['latency_p50']}s p95={report['latency_p95']}s")
+    if report["serial"]:
+        print(
+            f"script runs are serialized: latencies exclude queueing (queued p95={report['queued_p95']}s), "
+            f"so {args.users} users measure interleaved sessions, not concurrent throughput"
+        )
+    print(
+        f"RSS start={report['rss_start'] / mb:.1f}MB peak={report['rss_peak'] / mb:.1f}MB "
+        f"end={report['rss_end'] / mb:.1f}MB slope={report['rss_slope_bytes_per_request'] / 1024:.1f}KB/request"
+    )
+    print("Top allocation growth since warm-up:")
+    for allocator in report["top_growth_since_warmup"][:5]:
+        print(f"  {allocator['size_diff'] / 1024:+.1f}KB  {allocator['location']}")
+    for error in report["session_isolation_errors"]:
+        print(f"SESSION MIX-UP: {error}")
+    if report["leak_suspected"]:
+        print("LEAK SUSPECTED: RSS kept growing after warm-up")
+    return 1 if report["leak_suspected"] or report["session_isolation_errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
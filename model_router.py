@@ -0,0 +1,445 @@
+import asyncio
+import json
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+from agno.exceptions import ModelProviderError
+from agno.models.base import Model
+from agno.models.response import ModelResponse
+
+# Model ids from cheapest to most capable
+MODEL_TIERS = ["gemini-2.5-flash-lite", "gemini-2.5-flash", "gemini-2.5-pro"]
+
+# Cheapest tier that is adequate for each sub-task
+TASK_TIERS = {
+    "keyword_expansion": "gemini-2.5-flash-lite",
+    "paper_summary": "gemini-2.5-flash",
+    "synthesis": "gemini-2.5-pro",
+}
+
+# Seconds between checks on calls still waiting for a free worker
+QUEUE_POLL_INTERVAL = 0.05
+
+# Provider status codes worth retrying on another tier (rate limits and overloads)
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+def is_retryable(error: BaseException) -> bool:
+    if isinstance(error, ModelProviderError):
+        return error.status_code in RETRYABLE_STATUS_CODES
+    return isinstance(error, (TimeoutError, ConnectionError))
+
+
+@dataclass
+class ModelStats:
+    """Exponentially weighted latency and error rate for one model."""
+
+    latency_ewma: Optional[float] = None
+    error_ewma: float = 0.0
+    last_failure: float = 0.0
+    calls: int = 0
+    failures: int = 0
+
+    def record(self, latency: float, failed: bool, alpha: float) -> None:
+        self.calls += 1
+        if failed:
+            self.failures += 1
+            self.last_failure = time.monotonic()
+        else:
+            self.latency_ewma = latency if self.latency_ewma is None else alpha * latency + (1 - alpha) * self.latency_ewma
+        self.error_ewma = alpha * float(failed) + (1 - alpha) * self.error_ewma
+
+
+@dataclass
+class _Call:
+    """One call to one model, timed from when a worker starts running it."""
+
+    model: Model
+    started: Optional[float] = None
+    abandoned: threading.Event = field(default_factory=threading.Event)
+
+
+@dataclass
+class _RoutedResponse:
+    """A raw provider response tagged with the model that produced it."""
+
+    model: Model
+    raw: Any
+
+
+class ModelRouter:
+    """Sends each sub-task to the cheapest adequate Gemini tier and fails over on overloads.
+
+    Every task starts at its tier in TASK_TIERS, then falls back to stronger tiers
+    and finally to cheaper ones. Per-model latency and error EWMAs steer traffic:
+    a model whose error rate is above ``max_error_rate`` is tried last until
+    ``cooldown`` seconds pass without a failure. With ``hedge=True`` a second tier
+    is started when the first is slower than ``hedge_factor`` times its usual latency.
+    Timeouts and hedges count from when a worker starts a call, so time spent
+    waiting for one of the ``max_workers`` threads is never charged to a model.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        model_factory: Optional[Callable[[str], Model]] = None,
+        tiers: Optional[List[str]] = None,
+        task_tiers: Optional[Dict[str, str]] = None,
+        timeout: float = 120.0,
+        hedge: bool = False,
+        hedge_factor: float = 2.0,
+        min_hedge_delay: float = 5.0,
+        alpha: float = 0.2,
+        max_error_rate: float = 0.5,
+        cooldown: float = 60.0,
+        max_workers: int = 16,
+    ):
+        self.tiers = tiers or MODEL_TIERS
+        self.task_tiers = task_tiers or TASK_TIERS
+        self.timeout = timeout
+        self.hedge = hedge
+        self.hedge_factor = hedge_factor
+        self.min_hedge_delay = min_hedge_delay
+        self.alpha = alpha
+        self.max_error_rate = max_error_rate
+        self.cooldown = cooldown
+        self.max_workers = max_workers
+
+        if model_factory is None:
+            from agno.models.google import Gemini
+
+            def model_factory(model_id: str) -> Model:
+                return Gemini(id=model_id, api_key=api_key)
+
+        self.models = {model_id: model_factory(model_id) for model_id in self.tiers}
+        self.stats = {model_id: ModelStats() for model_id in self.tiers}
+        self._tier_ids = {id(model): model_id for model_id, model in self.models.items()}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="model-router")
+
+    def __deepcopy__(self, memo):
+        # Agents deep-copy their model; the router and its statistics stay shared
+        return self
+
+    def for_task(self, task: str) -> "RoutedModel":
+        return RoutedModel(id=f"router:{task}", router=self, task=task)
+
+    def candidates(self, task: str) -> List[Model]:
+        """Models to try for a task, preferred tier first and unhealthy models last."""
+        start = self.tiers.index(self.task_tiers.get(task, self.tiers[-1]))
+        order = self.tiers[start:] + self.tiers[:start][::-1]
+        now = time.monotonic()
+        with self._lock:
+            healthy = [
+                model_id for model_id in order
+                if self.stats[model_id].error_ewma < self.max_error_rate
+                or now - self.stats[model_id].last_failure > self.cooldown
+            ]
+        return [self.models[model_id] for model_id in healthy + [m for m in order if m not in healthy]]
+
+    def record(
+        self, model: Model, latency: float, failed: bool, abandoned: Optional[threading.Event] = None
+    ) -> None:
+        with self._lock:
+            # A call given up on after a timeout was already counted as a failure
+            if abandoned is not None and abandoned.is_set():
+                return
+            self.stats[self._tier_ids[id(model)]].record(latency, failed, self.alpha)
+
+    def abandon(self, model: Model, latency: float, abandoned: threading.Event) -> None:
+        """Count a timed-out call as failed once; its worker's late result is then ignored."""
+        with self._lock:
+            if not abandoned.is_set():
+                abandoned.set()
+                self.stats[self._tier_ids[id(model)]].record(latency, True, self.alpha)
+
+    def hedge_delay(self, model: Model) -> float:
+        latency = self.stats[self._tier_ids[id(model)]].latency_ewma
+        return max(self.min_hedge_delay, self.hedge_factor * latency) if latency else self.min_hedge_delay
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Current per-model statistics, for logging and load tests."""
+        with self._lock:
+            return {model_id: vars(stats).copy() for model_id, stats in self.stats.items()}
+
+    def _timed_call(self, call: _Call, method: str, kwargs: Dict[str, Any]) -> Any:
+        call.started = started = time.monotonic()
+        try:
+            result = getattr(call.model, method)(**kwargs)
+        except Exception as e:
+            self.record(call.model, time.monotonic() - started, is_retryable(e), call.abandoned)
+            raise
+        self.record(call.model, time.monotonic() - started, False, call.abandoned)
+        return result
+
+
+@dataclass
+class RoutedModel(Model):
+    """An agno Model that delegates every call to the router's tiers for one task.
+
+    All tiers must share a message format (Gemini models, or MockModels in tests),
+    so formatting hooks are delegated to the task's preferred model.
+    """
+
+    id: str = "router"
+    name: Optional[str] = "ModelRouter"
+    provider: Optional[str] = "ModelRouter"
+    router: Optional[ModelRouter] = None
+    task: str = "synthesis"
+
+    def __post_init__(self):
+        super().__post_init__()
+        primary = self.primary
+        self.supports_native_structured_outputs = primary.supports_native_structured_outputs
+        self.supports_json_schema_outputs = primary.supports_json_schema_outputs
+        self.tool_message_role = primary.tool_message_role
+        self.assistant_message_role = primary.assistant_message_role
+
+    @property
+    def primary(self) -> Model:
+        return self.router.models[self.router.task_tiers.get(self.task, self.router.tiers[-1])]
+
+    def invoke(self, **kwargs) -> _RoutedResponse:
+        candidates = self.router.candidates(self.task)
+        pending: Dict[Any, _Call] = {}
+        last_error: Optional[BaseException] = None
+
+        def launch() -> None:
+            call = _Call(candidates.pop(0))
+            pending[self.router._executor.submit(self.router._timed_call, call, "invoke", kwargs)] = call
+
+        launch()
+        while pending:
+            now = time.monotonic()
+            running = [call for call in pending.values() if call.started is not None]
+            deadlines = [call.started + self.router.timeout for call in running]
+            if len(running) < len(pending):
+                # Queued calls are not timed yet; check again once they may have started
+                deadlines.append(now + QUEUE_POLL_INTERVAL)
+            hedge_at = None
+            if self.router.hedge and candidates and running and len(running) == len(pending):
+                latest = max(running, key=lambda call: call.started)
+                hedge_at = latest.started + self.router.hedge_delay(latest.model)
+                deadlines.append(hedge_at)
+            done, _ = wait(pending, timeout=max(0.0, min(deadlines) - now), return_when=FIRST_COMPLETED)
+
+            for future in done:
+                model = pending.pop(future).model
+                try:
+                    return _RoutedResponse(model, future.result())
+                except Exception as e:
+                    if not is_retryable(e):
+                        raise
+                    last_error = e
+
+            now = time.monotonic()
+            for future, call in list(pending.items()):
+                if call.started is not None and now - call.started >= self.router.timeout and not future.done():
+                    # The worker thread cannot be interrupted; abandon it and count a failure
+                    del pending[future]
+                    self.router.abandon(call.model, now - call.started, call.abandoned)
+                    last_error = TimeoutError(f"{call.model.id} did not respond within {self.router.timeout}s")
+            if candidates and (not pending or (hedge_at is not None and now >= hedge_at)):
+                launch()
+        raise ModelProviderError(
+            message=f"All models failed for task '{self.task}': {last_error}",
+            status_code=getattr(last_error, "status_code", 503),
+            model_name=self.name,
+            model_id=self.id,
+        ) from last_error
+
+    async def ainvoke(self, **kwargs) -> _RoutedResponse:
+        candidates = self.router.candidates(self.task)
+        pending: Dict[asyncio.Task, tuple] = {}
+        last_error: Optional[BaseException] = None
+
+        async def timed_call(model: Model) -> Any:
+            started = time.monotonic()
+            try:
+                result = await asyncio.wait_for(model.ainvoke(**kwargs), timeout=self.router.timeout)
+            except Exception as e:
+                self.router.record(model, time.monotonic() - started, failed=is_retryable(e))
+                raise
+            self.router.record(model, time.monotonic() - started, failed=False)
+            return result
+
+        def launch() -> None:
+            model = candidates.pop(0)
+            pending[asyncio.ensure_future(timed_call(model))] = (model, time.monotonic())
+
+        launch()
+        try:
+            while pending:
+                wait_for = None
+                if self.router.hedge and candidates:
+                    latest_model, latest_start = max(pending.values(), key=lambda item: item[1])
+                    wait_for = max(0.0, latest_start + self.router.hedge_delay(latest_model) - time.monotonic())
+                done, _ = await asyncio.wait(pending, timeout=wait_for, return_when=asyncio.FIRST_COMPLETED)
+
+                for task in done:
+                    model, _ = pending.pop(task)
+                    try:
+                        return _RoutedResponse(model, task.result())
+                    except Exception as e:
+                        if not is_retryable(e):
+                            raise
+                        last_error = e
+                if candidates and (not pending or not done):
+                    launch()
+        finally:
+            for task in pending:
+                task.cancel()
+        raise ModelProviderError(
+            message=f"All models failed for task '{self.task}': {last_error}",
+            status_code=getattr(last_error, "status_code", 503),
+            model_name=self.name,
+            model_id=self.id,
+        ) from last_error
+
+    def invoke_stream(self, **kwargs) -> Iterator[_RoutedResponse]:
+        # Streams can only fail over before the first chunk has been yielded
+        last_error: Optional[BaseException] = None
+        for model in self.router.candidates(self.task):
+            started = time.monotonic()
+            stream = model.invoke_stream(**kwargs)
+            try:
+                first = next(stream)
+            except StopIteration:
+                self.router.record(model, time.monotonic() - started, failed=False)
+                return
+            except Exception as e:
+                self.router.record(model, time.monotonic() - started, failed=is_retryable(e))
+                if not is_retryable(e):
+                    raise
+                last_error = e
+                continue
+            self.router.record(model, time.monotonic() - started, failed=False)
+            yield _RoutedResponse(model, first)
+            for chunk in stream:
+                yield _RoutedResponse(model, chunk)
+            return
+        raise ModelProviderError(
+            message=f"All models failed for task '{self.task}': {last_error}",
+            status_code=getattr(last_error, "status_code", 503),
+            model_name=self.name,
+            model_id=self.id,
+        ) from last_error
+
+    async def ainvoke_stream(self, **kwargs) -> AsyncIterator[_RoutedResponse]:
+        last_error: Optional[BaseException] = None
+        for model in self.router.candidates(self.task):
+            started = time.monotonic()
+            stream = model.ainvoke_stream(**kwargs).__aiter__()
+            try:
+                first = await asyncio.wait_for(stream.__anext__(), timeout=self.router.timeout)
+            except StopAsyncIteration:
+                self.router.record(model, time.monotonic() - started, failed=False)
+                return
+            except Exception as e:
+                self.router.record(model, time.monotonic() - started, failed=is_retryable(e))
+                if not is_retryable(e):
+                    raise
+                last_error = e
+                continue
+            self.router.record(model, time.monotonic() - started, failed=False)
+            yield _RoutedResponse(model, first)
+            async for chunk in stream:
+                yield _RoutedResponse(model, chunk)
+            return
+        raise ModelProviderError(
+            message=f"All models failed for task '{self.task}': {last_error}",
+            status_code=getattr(last_error, "status_code", 503),
+            model_name=self.name,
+            model_id=self.id,
+        ) from last_error
+
+    def parse_provider_response(self, response: _RoutedResponse, **kwargs) -> ModelResponse:
+        return response.model.parse_provider_response(response.raw, **kwargs)
+
+    def parse_provider_response_delta(self, response: _RoutedResponse) -> ModelResponse:
+        return response.model.parse_provider_response_delta(response.raw)
+
+    def format_function_call_results(self, messages, function_call_results, **kwargs) -> None:
+        return self.primary.format_function_call_results(messages, function_call_results, **kwargs)
+
+    def get_instructions_for_model(self, tools: Optional[List[Any]] = None) -> Optional[List[str]]:
+        return self.primary.get_instructions_for_model(tools)
+
+    def get_system_message_for_model(self, tools: Optional[List[Any]] = None) -> Optional[str]:
+        return self.primary.get_system_message_for_model(tools)
+
+
+@dataclass
+class MockModel(Model):
+    """A local stand-in for a Gemini tier, for tests and load runs without network access.
+
+    Replies with ``reply`` after ``latency`` seconds, and fails with ``failure_status``
+    on the first ``fail_first`` calls and then with probability ``failure_rate``.
+    With ``tool_call`` set, a user turn is first answered with a call to that tool,
+    using ``tool_arguments(user_message)`` as its arguments.
+    """
+
+    id: str = "mock"
+    name: Optional[str] = "MockModel"
+    provider: Optional[str] = "Mock"
+    reply: str = "Mock response."
+    latency: float = 0.0
+    failure_rate: float = 0.0
+    fail_first: int = 0
+    failure_status: int = 503
+    seed: Optional[int] = None
+    tool_call: Optional[str] = None
+    tool_arguments: Optional[Callable[[str], Dict[str, Any]]] = None
+    _calls: int = field(default=0, init=False, repr=False)
+
+    def __post_init__(self):
+        super().__post_init__()
+        self._random = random.Random(self.seed)
+        self._calls_lock = threading.Lock()
+
+    def _should_fail(self) -> bool:
+        with self._calls_lock:
+            self._calls += 1
+            calls = self._calls
+        return calls <= self.fail_first or self._random.random() < self.failure_rate
+
+    def _failure(self) -> ModelProviderError:
+        return ModelProviderError(
+            message=f"{self.id} is overloaded", status_code=self.failure_status, model_name=self.name, model_id=self.id
+        )
+
+    def _reply(self, messages: Optional[List[Any]] = None, tools: Optional[List[Any]] = None, **kwargs) -> Any:
+        if self._should_fail():
+            raise self._failure()
+        last = messages[-1] if messages else None
+        if self.tool_call and tools and last is not None and last.role == "user":
+            arguments = self.tool_arguments(last.get_content_string()) if self.tool_arguments else {}
+            return {"id": f"call_{self._calls}", "type": "function",
+                    "function": {"name": self.tool_call, "arguments": json.dumps(arguments)}}
+        return self.reply
+
+    def invoke(self, **kwargs) -> Any:
+        time.sleep(self.latency)
+        return self._reply(**kwargs)
+
+    async def ainvoke(self, **kwargs) -> Any:
+        await asyncio.sleep(self.latency)
+        return self._reply(**kwargs)
+
+    def invoke_stream(self, **kwargs) -> Iterator[Any]:
+        yield self.invoke(**kwargs)
+
+    async def ainvoke_stream(self, **kwargs) -> AsyncIterator[Any]:
+        yield await self.ainvoke(**kwargs)
+
+    def parse_provider_response(self, response: Any, **kwargs) -> ModelResponse:
+        if isinstance(response, dict):
+            return ModelResponse(role="assistant", tool_calls=[response])
+        return ModelResponse(role="assistant", content=response)
+
+    def parse_provider_response_delta(self, response: Any) -> ModelResponse:
+        return self.parse_provider_response(response)
@@ -0,0 +1,426 @@
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from difflib import SequenceMatcher
+from typing import Any, Dict, Iterable, List, Optional
+from xml.etree import ElementTree
+
+import httpx
+from agno.exceptions import ModelProviderError
+from agno.models.base import Model
+from agno.models.message import Message
+from agno.tools import Toolkit
+
+from evidence import score_corpus, summarize_evidence
+from run_context import current_run
+
+# Overridable so load tests can point the tools at a local stand-in
+EUTILS_URL = os.getenv("PUBMED_EUTILS_URL", "https://eutils.ncbi.nlm.nih.gov/entrez/eutils")
+
+# CommentsCorrections relations that point from a satellite record (erratum,
+# comment, notice, republication) at the study it belongs to.
+LINKED_REF_TYPES = {
+    "ErratumFor", "CommentOn", "RepublishedFrom", "ReprintOf", "UpdateOf",
+    "RetractionOf", "PartialRetractionOf", "ExpressionOfConcernFor",
+    "CorrectedandRepublishedFrom", "SummaryForPatientsIn", "OriginalReportIn",
+}
+
+# Relations that make two primary articles the same study (republications and updates)
+PRIMARY_LINK_REF_TYPES = {"RepublishedFrom", "ReprintOf", "UpdateOf", "CorrectedandRepublishedFrom"}
+
+# Publication types that should never be chosen as the canonical record
+# when a primary article is available in the same group.
+SATELLITE_PUBLICATION_TYPES = {
+    "Published Erratum", "Comment", "Letter", "Editorial", "Retraction of Publication",
+    "Retraction Notice", "Expression of Concern", "Duplicate Publication", "News",
+}
+
+TITLE_SIMILARITY_THRESHOLD = 0.92
+
+KEYWORD_EXPANSION_PROMPT = (
+    "You turn a question about Ayurveda into PubMed search queries. Return 3-6 queries, one per line, "
+    "with no numbering or commentary. Combine common and scientific names with OR (e.g. "
+    "\"ashwagandha OR withania somnifera\") and vary the outcome and study-design terms between queries."
+)
+
+PAPER_SUMMARY_PROMPT = (
+    "Summarize this PubMed abstract in at most 120 words for a research synthesis. Keep the study design, "
+    "population and sample size, intervention with dose and duration, main outcomes with numbers and "
+    "p-values, and any safety findings. Do not add information that is not in the abstract."
+)
+
+# Numbers and Roman numerals distinguish otherwise identical titles ("Type 1"/"Type 2", "part I"/"part II")
+ROMAN_NUMERALS = {"i", "ii", "iii", "iv", "v", "vi", "vii", "viii", "ix", "x", "xi", "xii"}
+
+
+def normalize_title(title: str) -> str:
+    """Lowercase a title and strip punctuation, erratum prefixes and extra spaces."""
+    title = title.lower()
+    title = re.sub(r"^(erratum|correction|corrigendum|retraction|comment)( to| on| for)?[:\s]+", "", title)
+    title = re.sub(r"[^a-z0-9 ]+", " ", title)
+    return " ".join(title.split())
+
+
+def title_numbers(title: str) -> List[str]:
+    """Digits and Roman numerals of a normalized title, in order."""
+    return [token for token in title.split() if token.isdigit() or token in ROMAN_NUMERALS]
+
+
+def titles_match(first: str, second: str, threshold: float = TITLE_SIMILARITY_THRESHOLD) -> bool:
+    """Return True when two normalized titles describe the same publication."""
+    if not first or not second:
+        return False
+    if first == second:
+        return True
+    if title_numbers(first) != title_numbers(second):
+        return False
+    matcher = SequenceMatcher(None, first, second, autojunk=False)
+    # quick_ratio is an upper bound, so it cheaply rejects most pairs
+    return matcher.quick_ratio() >= threshold and matcher.ratio() >= threshold
+
+
+class _DisjointSet:
+    def __init__(self, items: Iterable[str]):
+        self.parent = {item: item for item in items}
+
+    def find(self, item: str) -> str:
+        while self.parent[item] != item:
+            self.parent[item] = self.parent[self.parent[item]]
+            item = self.parent[item]
+        return item
+
+    def union(self, first: str, second: str) -> None:
+        root_first, root_second = self.find(first), self.find(second)
+        if root_first != root_second:
+            self.parent[root_second] = root_first
+
+
+def parse_pubmed_articles(xml_text: str) -> Dict[str, dict]:
+    """Parse an efetch XML payload into records keyed by PMID."""
+    records = {}
+    root = ElementTree.fromstring(xml_text)
+    for article in root.findall(".//PubmedArticle"):
+        pmid = article.findtext(".//MedlineCitation/PMID", default="").strip()
+        if not pmid:
+            continue
+        abstract = " ".join(
+            "".join(node.itertext()).strip() for node in article.findall(".//Abstract/AbstractText")
+        )
+        authors = []
+        for author in article.findall(".//AuthorList/Author"):
+            last_name = author.findtext("LastName")
+            if last_name:
+                authors.append(f"{last_name} {author.findtext('Initials', default='')}".strip())
+        title_node = article.find(".//ArticleTitle")
+        year = article.findtext(".//JournalIssue/PubDate/Year") or article.findtext(
+            ".//JournalIssue/PubDate/MedlineDate", default=""
+        )[:4]
+        records[pmid] = {
+            "pmid": pmid,
+            "title": "".join(title_node.itertext()).strip() if title_node is not None else "",
+            "authors": authors,
+            "journal": article.findtext(".//Journal/Title", default=""),
+            "year": int(year) if year.isdigit() else None,
+            "publication_types": [node.text for node in article.findall(".//PublicationTypeList/PublicationType") if node.text],
+            "mesh_terms": [node.text for node in article.findall(".//MeshHeadingList/MeshHeading/DescriptorName") if node.text],
+            "abstract": abstract,
+            "relations": [
+                {"type": node.get("RefType"), "pmid": node.findtext("PMID", default="").strip()}
+                for node in article.findall(".//CommentsCorrectionsList/CommentsCorrections")
+                if node.findtext("PMID")
+            ],
+            "url": f"https://pubmed.ncbi.nlm.nih.gov/{pmid}/",
+        }
+    return records
+
+
+def repeated_study(study: dict) -> dict:
+    """A study the model already received in this run, without its text."""
+    return {"pmid": study["pmid"], "title": study["title"], "evidence": study["evidence"], "returned_earlier": True}
+
+
+def is_satellite(record: dict) -> bool:
+    return bool(SATELLITE_PUBLICATION_TYPES.intersection(record.get("publication_types", [])))
+
+
+def choose_canonical(group: List[dict]) -> dict:
+    """Pick the primary article of a group: non-satellite, with an abstract, earliest."""
+    return min(
+        group,
+        key=lambda record: (
+            is_satellite(record),
+            not record.get("abstract"),
+            record.get("year") or 9999,
+            int(record["pmid"]) if record["pmid"].isdigit() else 0,
+        ),
+    )
+
+
+def similar_length_pairs(
+    pmids: List[str], titles: Dict[str, str], threshold: float = TITLE_SIMILARITY_THRESHOLD
+) -> Iterable[tuple]:
+    """Yield every pair of PMIDs whose title lengths allow a similarity ratio of ``threshold``.
+
+    The ratio of two strings is at most 2 * shorter / (shorter + longer), so after
+    sorting by length each title is only compared with the next few longer ones.
+    Titles that differ in their first words ("Effect of" / "The effects of") still meet.
+    """
+    ordered = sorted(pmids, key=lambda pmid: len(titles[pmid]))
+    for index, pmid in enumerate(ordered):
+        length = len(titles[pmid])
+        for other_pmid in ordered[index + 1:]:
+            if 2 * length / (length + len(titles[other_pmid])) < threshold:
+                break
+            yield pmid, other_pmid
+
+
+def collapse_studies(records: Dict[str, dict]) -> List[dict]:
+    """Group related records into studies and return one canonical record per study.
+
+    Primary articles are merged when one republishes or updates another
+    (PRIMARY_LINK_REF_TYPES) or when their normalized titles are near-identical.
+    Each satellite record (erratum, comment, editorial, notice) is then attached
+    to a single primary: the first one it cites through LINKED_REF_TYPES, else
+    one with a matching title. Satellites never join two primaries together.
+    Each canonical record gains a ``related_pmids`` list.
+    """
+    primaries = [pmid for pmid, record in records.items() if not is_satellite(record)]
+    satellites = [pmid for pmid, record in records.items() if is_satellite(record)]
+    titles = {pmid: normalize_title(record.get("title", "")) for pmid, record in records.items()}
+
+    groups = _DisjointSet(primaries)
+    for pmid in primaries:
+        for relation in records[pmid].get("relations", []):
+            if relation["type"] in PRIMARY_LINK_REF_TYPES and relation["pmid"] in groups.parent:
+                groups.union(relation["pmid"], pmid)
+
+    titled = [pmid for pmid in primaries if titles[pmid]]
+    for pmid, other_pmid in similar_length_pairs(titled, titles):
+        if titles_match(titles[pmid], titles[other_pmid]):
+            groups.union(pmid, other_pmid)
+
+    grouped: Dict[str, List[dict]] = {}
+    for pmid in primaries:
+        grouped.setdefault(groups.find(pmid), []).append(records[pmid])
+
+    for pmid in satellites:
+        cited = [
+            relation["pmid"] for relation in records[pmid].get("relations", [])
+            if relation["type"] in LINKED_REF_TYPES and relation["pmid"] in groups.parent
+        ]
+        if not cited and titles[pmid]:
+            cited = [other for other in titled if titles_match(titles[pmid], titles[other])]
+        # A satellite without a primary in the result set stands as its own study
+        key = groups.find(cited[0]) if cited else pmid
+        grouped.setdefault(key, []).append(records[pmid])
+
+    studies = []
+    for group in grouped.values():
+        canonical = dict(choose_canonical(group))
+        canonical["related_pmids"] = sorted(r["pmid"] for r in group if r["pmid"] != canonical["pmid"])
+        studies.append(canonical)
+    return studies
+
+
+class DedupPubmedTools(Toolkit):
+    """PubMed search that merges several keyword iterations into de-duplicated studies."""
+
+    def __init__(
+        self,
+        email: Optional[str] = None,
+        max_results_per_query: int = 20,
+        max_cached_records: int = 2000,
+        timeout: float = 30.0,
+        session_store: Optional[Any] = None,
+        keyword_model: Optional[Model] = None,
+        summary_model: Optional[Model] = None,
+        max_summary_workers: int = 8,
+        **kwargs,
+    ):
+        self.email = email
+        self.max_results_per_query = max_results_per_query
+        self.max_cached_records = max_cached_records
+        self.timeout = timeout
+        # Optional session_memory.SessionStore; follow-up turns reuse the session's records
+        self.session_store = session_store
+        self._record_cache: "OrderedDict[str, dict]" = OrderedDict()
+        # The toolkit is shared between Playground sessions and Streamlit reruns
+        self._cache_lock = threading.Lock()
+        # Cheap models for the sub-tasks (ModelRouter "keyword_expansion" / "paper_summary" routes)
+        self.keyword_model = keyword_model
+        self.summary_model = summary_model
+        # One pool for every search, using at most half the router's workers so summaries of
+        # concurrent searches leave room for synthesis and failover calls
+        router_workers = getattr(getattr(summary_model, "router", None), "max_workers", None)
+        if router_workers:
+            max_summary_workers = min(max_summary_workers, max(1, router_workers // 2))
+        self.max_summary_workers = max_summary_workers
+        self._summary_executor = ThreadPoolExecutor(max_workers=max_summary_workers, thread_name_prefix="paper-summary")
+
+        tools = [self.search_pubmed]
+        if keyword_model is not None:
+            tools.insert(0, self.expand_keywords)
+        super().__init__(name="pubmed", tools=tools, **kwargs)
+
+    def _params(self, **params) -> dict:
+        if self.email:
+            params["email"] = self.email
+        return params
+
+    def fetch_pmids(self, query: str, max_results: int) -> List[str]:
+        response = httpx.get(
+            f"{EUTILS_URL}/esearch.fcgi",
+            params=self._params(db="pubmed", term=query, retmax=max_results, retmode="json"),
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        return response.json().get("esearchresult", {}).get("idlist", [])
+
+    def fetch_records(self, pmids: List[str]) -> Dict[str, dict]:
+        """Return records for the given PMIDs, fetching only those not already cached."""
+        with self._cache_lock:
+            missing = [pmid for pmid in pmids if pmid not in self._record_cache]
+        fetched: Dict[str, dict] = {}
+        if missing:
+            response = httpx.post(
+                f"{EUTILS_URL}/efetch.fcgi",
+                data=self._params(db="pubmed", id=",".join(missing), retmode="xml"),
+                timeout=self.timeout,
+            )
+            response.raise_for_status()
+            fetched = parse_pubmed_articles(response.text)
+            # Evidence is scored once per batch and cached alongside the record
+            for record, evidence in zip(fetched.values(), score_corpus(list(fetched.values()))):
+                record["evidence"] = evidence
+        records = {}
+        with self._cache_lock:
+            self._record_cache.update(fetched)
+            for pmid in pmids:
+                if pmid in self._record_cache:
+                    self._record_cache.move_to_end(pmid)
+                    records[pmid] = self._record_cache[pmid]
+            while len(self._record_cache) > self.max_cached_records:
+                self._record_cache.popitem(last=False)
+        return records
+
+    def _complete(self, model: Model, instructions: str, content: str) -> str:
+        response = model.response(
+            messages=[Message(role="system", content=instructions), Message(role="user", content=content)]
+        )
+        return (response.content or "").strip()
+
+    def summarize_records(self, records: List[dict]) -> None:
+        """Attach a short "summary" to records that lack one, one summary_model call per paper.
+
+        Summaries are stored on the cached record, so each paper is summarized once.
+        A paper whose call fails keeps only its abstract.
+        """
+        pending = [record for record in records if record.get("abstract") and not record.get("summary")]
+        if self.summary_model is None or not pending:
+            return
+
+        def summarize(record: dict) -> None:
+            try:
+                summary = self._complete(
+                    self.summary_model, PAPER_SUMMARY_PROMPT, f"Title: {record['title']}\n\nAbstract: {record['abstract']}"
+                )
+            except ModelProviderError:
+                return
+            if summary:
+                record["summary"] = summary
+
+        list(self._summary_executor.map(summarize, pending))
+
+    def expand_keywords(self, question: str) -> str:
+        """Turn the user's question into PubMed search queries to pass to search_pubmed.
+
+        Args:
+            question (str): The user's question or the topic to research.
+
+        Returns:
+            str: JSON list of PubMed queries.
+        """
+        try:
+            content = self._complete(self.keyword_model, KEYWORD_EXPANSION_PROMPT, question)
+        except ModelProviderError:
+            content = ""
+        queries = [line.strip(" -*•\t") for line in content.splitlines()]
+        queries = [re.sub(r"^\d+[.)]\s*", "", query) for query in queries if query.strip(" -*•\t")]
+        return json.dumps(queries or [question])
+
+    def search_pubmed(
+        self, queries: List[str], max_results_per_query: Optional[int] = None, agent: Any = None
+    ) -> str:
+        """Search PubMed with several keyword combinations at once and return de-duplicated studies.
+
+        Pass every search iteration in a single call. Overlapping results, errata,
+        comments and duplicate publications are collapsed into one study each, with
+        the collapsed PMIDs listed under "related_pmids". Studies are ranked by their
+        precomputed "evidence" score, and "evidence_overview" aggregates the corpus.
+        When a summary model is configured, each study carries a short "summary"
+        in place of its abstract.
+        Studies already retrieved earlier in the conversation are reused without
+        fetching them again and are marked "already_retrieved". Studies already
+        returned earlier in this run are listed only by PMID, title and evidence,
+        marked "returned_earlier".
+
+        Args:
+            queries (List[str]): PubMed search queries, one per keyword combination.
+            max_results_per_query (int, optional): Maximum PMIDs to take from each query.
+
+        Returns:
+            str: JSON object with "evidence_overview" and the ranked "studies".
+        """
+        if isinstance(queries, str):
+            queries = [queries]
+        limit = max_results_per_query or self.max_results_per_query
+        run = current_run(agent)
+        session = self.session_store.get(run.session_id) if self.session_store is not None and run.session_id else None
+        known = dict(session.records) if session is not None else {}
+        try:
+            # dict.fromkeys keeps the first-seen order while merging iterations
+            pmids = list(dict.fromkeys(pmid for query in queries for pmid in self.fetch_pmids(query, limit)))
+            missing = [pmid for pmid in pmids if pmid not in known]
+            fetched = self.fetch_records(missing) if missing else {}
+            records = {pmid: known.get(pmid) or fetched[pmid] for pmid in pmids if pmid in known or pmid in fetched}
+            studies = collapse_studies(records)
+        except (httpx.HTTPError, ElementTree.ParseError) as e:
+            return f"Could not fetch data from PubMed: {e}"
+        studies.sort(key=lambda study: study["evidence"]["score"], reverse=True)
+        # Only canonical studies are summarized; the satellites never reach the model
+        self.summarize_records([records[study["pmid"]] for study in studies])
+        for study in studies:
+            if records[study["pmid"]].get("summary"):
+                study["summary"] = records[study["pmid"]]["summary"]
+
+        if session is not None:
+            session.add_records(records)
+            question = (run.question or "; ".join(queries))[:200]
+            top_titles = "; ".join(study["title"][:80] for study in studies[:3])
+            session.add_summary(
+                f"{question} -> {len(studies)} studies ({len(fetched)} newly fetched). Top: {top_titles}"
+            )
+
+        results = []
+        for study in studies:
+            if study["pmid"] in run.returned_pmids:
+                results.append(repeated_study(study))
+                continue
+            run.returned_pmids.add(study["pmid"])
+            study = {key: value for key, value in study.items() if key != "relations"}
+            if study.get("summary"):
+                # The summary keeps the numbers the synthesis needs at a fraction of the tokens
+                study.pop("abstract", None)
+            if study["pmid"] in known:
+                study["already_retrieved"] = True
+            results.append(study)
+        return json.dumps(
+            {
+                "evidence_overview": summarize_evidence([study["evidence"] for study in studies]),
+                "studies": results,
+            },
+            indent=2,
+        )
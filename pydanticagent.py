@@ -2,9 +2,9 @@ import os
 from dotenv import load_dotenv
 from typing import List, Optional
 from pydantic import BaseModel, Field
-from agno.agent import Agent
-from agno.models.google import Gemini
-from agno.tools.pubmed import PubmedTools
+from pubmed_dedup import DedupPubmedTools
+from model_router import ModelRouter
+from run_context import RunScopedAgent
 
 import streamlit as st
 
@@ -76,7 +76,9 @@ SEARCH STRATEGY:
 2. Construct comprehensive search queries using these guidelines:
    - Use both common names AND scientific names (e.g., "ashwagandha OR withania somnifera"), use ayurvedic_keywords dictionary for reference
    - Include relevant synonyms and related terms
-   - Use multiple search iterations with different keyword combinations
+   - Call expand_keywords with the user's question for ready-made PubMed queries, then add or adjust queries as needed
+   - Use multiple search iterations with different keyword combinations, passing them all to search_pubmed in a single call
+   - Results are de-duplicated studies: PMIDs under "related_pmids" (errata, comments, duplicate publications) belong to the same study, so count and summarize each study once. Each study carries a short "summary" of its abstract; studies marked "returned_earlier" were already given to you in full by an earlier call
    - Search for at least 20-50 papers initially to ensure comprehensive coverage
 
 PAPER EVALUATION CRITERIA:
@@ -118,6 +120,7 @@ STRUCTURED OUTPUT REQUIREMENTS:
 QUALITY STANDARDS:
 - Prioritize recent studies (last 10 years) but include landmark older studies
 - Focus on human clinical trials and systematic reviews when available
+- Use each study's precomputed "evidence" record for ranking, study_type and sample_size rather than re-deriving them
 - Include diverse study types (RCTs, observational studies, mechanistic studies)
 - Ensure summaries are detailed and informative, not generic
 - Provide specific, actionable insights
@@ -141,12 +144,12 @@ REPORT STRUCTURE:
 
 ## Executive Summary
 - Direct answer to the user's question
-- Overall state of research quality and quantity
+- Overall state of research quality and quantity (evidence_overview.state_of_research)
 - Key clinical recommendations based on evidence
 
 ## Research Overview
-- Total studies analyzed and their types
-- Quality assessment of the research base
+- Total studies analyzed and their types (from the search_pubmed "evidence_overview")
+- Quality assessment of the research base, based on the stored evidence grades
 - Geographic and temporal distribution of studies
 
 ## Key Findings
@@ -223,11 +226,28 @@ If no relevant papers are found after thorough searching, explain your search st
 ]
 
 
-ayurvedic_assistant = Agent(
+# Routes each sub-task to the cheapest adequate Gemini tier, failing over on 503s and timeouts.
+# Cached so the latency/error statistics survive Streamlit reruns.
+@st.cache_resource
+def get_model_router() -> ModelRouter:
+    return ModelRouter(api_key=os.getenv('GOOGLE_API_KEY'))
+
+model_router = get_model_router()
+
+# Cached so fetched records and their evidence scores are reused across queries
+@st.cache_resource
+def get_pubmed_tools() -> DedupPubmedTools:
+    return DedupPubmedTools(
+        keyword_model=model_router.for_task("keyword_expansion"),
+        summary_model=model_router.for_task("paper_summary"),
+    )
+
+# Run-scoped so repeated search_pubmed calls in one run don't return the same studies in full again
+ayurvedic_assistant = RunScopedAgent(
     name="Ayurvedic Research Assistant",
-    model=Gemini(id='gemini-2.5-pro', api_key=os.getenv('GOOGLE_API_KEY')),
+    model=model_router.for_task("synthesis"),
     description='A comprehensive assistant that searches PubMed, synthesizes Ayurvedic research, and generates detailed reports.',
-    tools=[PubmedTools(results_expanded=True)],
+    tools=[get_pubmed_tools()],
     instructions=consolidated_instructions,
     show_tool_calls=True,
     markdown=True,
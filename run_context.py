@@ -0,0 +1,98 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Iterator, Optional, Set
+from uuid import uuid4
+
+from agno.agent import Agent
+
+
+@dataclass
+class RunContext:
+    """State of one agent run, visible to the tools it calls."""
+
+    session_id: Optional[str] = None
+    question: Optional[str] = None
+    # PMIDs whose details a tool already returned earlier in this run
+    returned_pmids: Set[str] = field(default_factory=set)
+
+
+_current_run: ContextVar[Optional[RunContext]] = ContextVar("current_run", default=None)
+
+
+def current_run(agent: Any = None) -> RunContext:
+    """The context of the run calling a tool.
+
+    Outside a RunScopedAgent run, falls back to a throwaway context for the
+    agent's current session, which is only reliable when no other run shares the agent.
+    """
+    context = _current_run.get()
+    if context is None:
+        context = RunContext(
+            session_id=getattr(agent, "session_id", None), question=_question(getattr(agent, "run_input", None))
+        )
+    return context
+
+
+@contextmanager
+def bound_run(context: RunContext) -> Iterator[RunContext]:
+    """Make ``context`` the current run for the code inside the block."""
+    token = _current_run.set(context)
+    try:
+        yield context
+    finally:
+        _current_run.reset(token)
+
+
+def _question(message: Any) -> Optional[str]:
+    content = getattr(message, "content", message)
+    return content if isinstance(content, str) else None
+
+
+class RunScopedAgent(Agent):
+    """An Agent whose tools see the session of their own run.
+
+    The Playground serves every request from one shared Agent, and each run
+    overwrites ``agent.session_id``, so tools must not read it while another run
+    may be starting. Each run binds a RunContext in a context variable instead;
+    the context follows the run into tool threads and streamed responses.
+    """
+
+    def run(self, message: Any = None, *, session_id: Optional[str] = None, **kwargs: Any) -> Any:
+        context = RunContext(session_id=session_id or self.session_id or str(uuid4()), question=_question(message))
+        with bound_run(context):
+            response = super().run(message, session_id=context.session_id, **kwargs)
+        if isinstance(response, Iterator):
+            return _bind_stream(response, context)
+        return response
+
+    async def arun(self, message: Any = None, *, session_id: Optional[str] = None, **kwargs: Any) -> Any:
+        context = RunContext(session_id=session_id or self.session_id or str(uuid4()), question=_question(message))
+        with bound_run(context):
+            response = await super().arun(message, session_id=context.session_id, **kwargs)
+        if isinstance(response, AsyncIterator):
+            return _abind_stream(response, context)
+        return response
+
+
+def _bind_stream(stream: Iterator, context: RunContext) -> Iterator:
+    # A streamed run executes while the caller iterates, in the caller's context
+    iterator = iter(stream)
+    while True:
+        with bound_run(context):
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                return
+        yield chunk
+
+
+async def _abind_stream(stream: AsyncIterator, context: RunContext) -> AsyncIterator:
+    iterator = stream.__aiter__()
+    while True:
+        with bound_run(context):
+            try:
+                chunk = await iterator.__anext__()
+            except StopAsyncIteration:
+                return
+        yield chunk
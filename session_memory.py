@@ -0,0 +1,151 @@
+import json
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional
+
+from agno.tools import Toolkit
+
+from evidence import summarize_evidence
+from pubmed_dedup import collapse_studies, repeated_study
+from run_context import current_run
+
+
+@dataclass
+class SessionMemory:
+    """Papers retrieved in one conversation plus a rolling summary of its turns."""
+
+    max_records: int = 200
+    max_summary_lines: int = 20
+    records: "OrderedDict[str, dict]" = field(default_factory=OrderedDict)
+    summary: Deque[str] = field(default_factory=deque)
+    last_used: float = field(default_factory=time.monotonic)
+
+    def add_records(self, records: Dict[str, dict]) -> None:
+        for pmid, record in records.items():
+            self.records[pmid] = record
+            self.records.move_to_end(pmid)
+        while len(self.records) > self.max_records:
+            self.records.popitem(last=False)
+
+    def add_summary(self, line: str) -> None:
+        self.summary.append(line)
+        while len(self.summary) > self.max_summary_lines:
+            self.summary.popleft()
+
+    def studies(self, topic: Optional[str] = None) -> List[dict]:
+        """Collapsed studies ranked by evidence, keeping those that mention every word of ``topic``."""
+        studies = collapse_studies(self.records)
+        if topic:
+            words = re.findall(r"[a-z0-9]+", topic.lower())
+            studies = [study for study in studies if all(word in _searchable_text(study) for word in words)]
+        studies.sort(key=lambda study: study["evidence"]["score"], reverse=True)
+        return studies
+
+
+def compact_study(study: dict) -> dict:
+    """The parts of a study needed to answer from memory: its summary, or its abstract when there is none."""
+    entry = {"pmid": study["pmid"], "title": study["title"], "evidence": study["evidence"]}
+    if study.get("summary"):
+        entry["summary"] = study["summary"]
+    else:
+        entry["abstract"] = study.get("abstract", "")
+    return entry
+
+
+def _searchable_text(study: dict) -> str:
+    parts = [study.get("title", ""), study.get("abstract", ""), study.get("summary", "")]
+    return " ".join(parts + list(study.get("mesh_terms", []))).lower()
+
+
+class SessionStore:
+    """Per-session memories with LRU eviction and an idle timeout."""
+
+    def __init__(
+        self,
+        max_sessions: int = 100,
+        ttl: float = 3600.0,
+        max_records_per_session: int = 200,
+        max_summary_lines: int = 20,
+    ):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.max_records_per_session = max_records_per_session
+        self.max_summary_lines = max_summary_lines
+        self._sessions: "OrderedDict[str, SessionMemory]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __deepcopy__(self, memo):
+        # Agent copies must keep sharing the same sessions
+        return self
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def get(self, session_id: str) -> SessionMemory:
+        """Return the memory for a session, creating it and evicting stale sessions as needed."""
+        now = time.monotonic()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = SessionMemory(
+                    max_records=self.max_records_per_session, max_summary_lines=self.max_summary_lines
+                )
+                self._sessions[session_id] = session
+            self._sessions.move_to_end(session_id)
+            session.last_used = now
+            # Least recently used sessions sit at the front
+            while self._sessions:
+                oldest_id, oldest = next(iter(self._sessions.items()))
+                if len(self._sessions) <= self.max_sessions and now - oldest.last_used <= self.ttl:
+                    break
+                del self._sessions[oldest_id]
+        return session
+
+    def discard(self, session_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+
+class SessionMemoryTools(Toolkit):
+    """Lets the agent reuse the papers it already retrieved earlier in the conversation."""
+
+    def __init__(self, store: SessionStore, max_studies: int = 15, **kwargs):
+        self.store = store
+        self.max_studies = max_studies
+        super().__init__(name="session_memory", tools=[self.recall_session_papers], **kwargs)
+
+    def recall_session_papers(self, agent: Any, topic: Optional[str] = None) -> str:
+        """Recall the studies already retrieved in this conversation and a summary of earlier turns.
+
+        Call this first for follow-up questions (e.g. "what about dosage?") and only
+        search PubMed again for what these papers do not cover. Studies come back
+        ranked by evidence with their summaries; pass a topic to narrow them down.
+        Studies already returned earlier in this run are listed without their text.
+
+        Args:
+            topic (str, optional): Keep only studies whose title, abstract or MeSH terms mention every word of it.
+
+        Returns:
+            str: JSON object with "summary", "evidence_overview", "total_studies" and the top "studies".
+        """
+        run = current_run(agent)
+        session = self.store.get(run.session_id) if run.session_id else None
+        if session is None or not session.records:
+            return json.dumps({"summary": [], "studies": []})
+        studies = session.studies(topic)
+        entries = [
+            repeated_study(study) if study["pmid"] in run.returned_pmids else compact_study(study)
+            for study in studies[: self.max_studies]
+        ]
+        run.returned_pmids.update(entry["pmid"] for entry in entries)
+        return json.dumps(
+            {
+                "summary": list(session.summary),
+                "evidence_overview": summarize_evidence([study["evidence"] for study in studies]),
+                "total_studies": len(studies),
+                "studies": entries,
+            }
+        )
@@ -0,0 +1,39 @@
+import pytest
+
+from evidence import extract_sample_size, score_corpus, summarize_evidence
+
+
+@pytest.mark.parametrize(
+    "abstract, expected",
+    [
+        ("We randomized 60 adults to 500 mg daily in patients with anxiety.", 60),
+        ("Ashwagandha was given for 12 weeks in 58 women.", 58),
+        ("A dose of 1500 ng in 40 patients was well tolerated.", 40),
+        ("2000 participants were enrolled across 12 centres.", 2000),
+        ("A total of 1,250 participants completed the survey.", 1250),
+        ("In 2019, we randomized 120 adults (n = 60 per arm).", 120),
+        ("Of the screened volunteers, n = 84 were analysed after 8 weeks.", 84),
+        ("Rats received 200 mg/kg for 28 days.", None),
+        ("Adults with insomnia (n = 60, mean age 42) took 300 mg.", 60),
+        ("Total sample size was n = 120.", 120),
+        ("We enrolled 84, of whom 80 completed.", 84),
+        ("Patients received 2.5 g for 12.5 weeks; 40 patients completed.", 40),
+    ],
+)
+def test_extract_sample_size(abstract, expected):
+    assert extract_sample_size(abstract) == expected
+
+
+def test_score_corpus_ranks_human_trials_above_animal_studies():
+    trial, animal = score_corpus(
+        [
+            {"publication_types": ["Randomized Controlled Trial"], "mesh_terms": ["Humans"],
+             "abstract": "We randomized 120 adults.", "year": 2022},
+            {"publication_types": ["Journal Article"], "mesh_terms": ["Animals"], "abstract": "", "year": 2005},
+        ],
+        current_year=2024,
+    )
+    assert trial["design"] == "randomized controlled trial" and trial["sample_size"] == 120
+    assert animal["population"] == "animal" and animal["sample_size"] is None
+    assert trial["score"] > animal["score"]
+    assert summarize_evidence([trial, animal])["human_clinical_trials"] == 1
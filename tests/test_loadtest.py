@@ -0,0 +1,83 @@
+import tracemalloc
+
+import pytest
+
+from loadtest import (
+    FOLLOW_UPS, QUERIES, LoadTest, RequestRecord, fake_pmids, parse_args, rss_slope, session_isolation_errors,
+)
+from session_memory import SessionStore
+
+KB = 1024
+MB = 1024 * 1024
+
+
+def make_test(users=1, requests=10, **options):
+    argv = ["playground", "--users", str(users), "--requests", str(requests)]
+    for name, value in options.items():
+        argv += [f"--{name.replace('_', '-')}", str(value)]
+    return LoadTest(parse_args(argv), send=lambda user, index, query: None)
+
+
+def report_for(test, rss_values):
+    test.records = [RequestRecord(0, index, "q", 0.1, rss, True) for index, rss in enumerate(rss_values)]
+    return test.report([(0.0, rss_values[0]), (1.0, rss_values[-1])], tracemalloc.Snapshot((), 1))
+
+
+def test_rss_slope_is_bytes_per_request():
+    assert rss_slope([]) == 0.0
+    assert rss_slope([5 * MB]) == 0.0
+    assert rss_slope([0, 10, 20, 30]) == pytest.approx(10.0)
+    assert rss_slope([100, 100, 100]) == 0.0
+
+
+def test_steady_growth_after_warm_up_is_a_leak():
+    report = report_for(make_test(), [100 * MB + index * MB for index in range(10)])
+    assert report["leak_suspected"]
+    assert report["steady_state_growth_bytes"] == 7 * MB
+
+
+def test_growth_during_warm_up_is_ignored():
+    # The first 20% of requests (2 of 10) are warm-up
+    report = report_for(make_test(), [100 * MB, 150 * MB] + [200 * MB] * 8)
+    assert not report["leak_suspected"]
+    assert report["steady_state_growth_bytes"] == 0
+
+
+def test_small_total_growth_is_not_a_leak_even_with_a_steep_slope():
+    report = report_for(make_test(), [100 * MB + index * 100 * KB for index in range(10)])
+    assert report["rss_slope_bytes_per_request"] > 50 * KB
+    assert not report["leak_suspected"]
+
+
+def test_shallow_slope_is_not_a_leak_even_with_large_growth():
+    report = report_for(make_test(requests=250), [100 * MB + index * 40 * KB for index in range(250)])
+    assert report["steady_state_growth_bytes"] > 5 * MB
+    assert not report["leak_suspected"]
+
+
+def test_query_for_alternates_new_questions_and_follow_ups():
+    test = make_test(users=2)
+    period = len(FOLLOW_UPS) + 1
+    assert test.query_for(0, 0) == QUERIES[0]
+    assert test.query_for(1, 0) == QUERIES[1]
+    assert [test.query_for(0, index) for index in range(1, period)] == FOLLOW_UPS
+    assert test.query_for(0, period) == QUERIES[period % len(QUERIES)]
+
+
+def test_session_isolation_flags_papers_from_other_sessions():
+    test = make_test(users=2, requests=1)
+    store = SessionStore()
+    for user in range(2):
+        query = test.query_for(user, 0)
+        session = store.get(f"loadtest-{user}")
+        session.add_records({pmid: {"pmid": pmid} for pmid in fake_pmids(query)})
+        session.add_summary(f"{query} -> 15 studies")
+    assert session_isolation_errors(store, test) == []
+
+    store.get("loadtest-0").add_records({pmid: {"pmid": pmid} for pmid in fake_pmids(test.query_for(1, 0))})
+    store.get("loadtest-0").add_summary(f"{test.query_for(1, 0)} -> 15 studies")
+    store.discard("loadtest-1")
+    errors = session_isolation_errors(store, test)
+    assert any("loadtest-0 holds" in error and "other sessions" in error for error in errors)
+    assert any("loadtest-0 recorded other sessions' questions" in error for error in errors)
+    assert "loadtest-1 holds no papers" in errors
@@ -0,0 +1,121 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from agno.exceptions import ModelProviderError
+from agno.models.message import Message
+
+from model_router import MODEL_TIERS, MockModel, ModelRouter
+from pubmed_dedup import DedupPubmedTools
+
+
+def make_router(mocks=None, **kwargs):
+    """A router whose tiers are MockModels, configured per tier by ``mocks``."""
+    mocks = mocks or {}
+    return ModelRouter(model_factory=lambda model_id: MockModel(id=model_id, **mocks.get(model_id, {})), **kwargs)
+
+
+def ask(routed):
+    return routed.invoke(messages=[Message(role="user", content="Ashwagandha for anxiety?")])
+
+
+def test_each_task_starts_at_its_tier():
+    router = make_router()
+    assert [ask(router.for_task(task)).model.id for task in ("keyword_expansion", "paper_summary", "synthesis")] == [
+        "gemini-2.5-flash-lite", "gemini-2.5-flash", "gemini-2.5-pro"
+    ]
+
+
+def test_fails_over_to_the_next_tier_on_503():
+    router = make_router({"gemini-2.5-flash": {"fail_first": 1}})
+    assert ask(router.for_task("paper_summary")).model.id == "gemini-2.5-pro"
+    assert router.snapshot()["gemini-2.5-flash"]["failures"] == 1
+
+
+def test_non_retryable_errors_are_raised():
+    router = make_router({"gemini-2.5-flash": {"fail_first": 1, "failure_status": 400}})
+    with pytest.raises(ModelProviderError):
+        ask(router.for_task("paper_summary"))
+    assert router.snapshot()["gemini-2.5-pro"]["calls"] == 0
+
+
+def test_all_tiers_failing_raises():
+    router = make_router({model_id: {"fail_first": 1} for model_id in MODEL_TIERS})
+    with pytest.raises(ModelProviderError) as error:
+        ask(router.for_task("synthesis"))
+    assert error.value.status_code == 503
+
+
+def test_fails_over_on_timeout_and_ignores_the_late_result():
+    router = make_router({"gemini-2.5-flash": {"latency": 0.3}}, timeout=0.05)
+    assert ask(router.for_task("paper_summary")).model.id == "gemini-2.5-pro"
+    # Let the abandoned worker finish; its success must not be recorded
+    time.sleep(0.4)
+    stats = router.snapshot()["gemini-2.5-flash"]
+    assert (stats["calls"], stats["failures"], stats["latency_ewma"]) == (1, 1, None)
+
+
+def test_hedges_a_slow_call_with_the_next_tier():
+    router = make_router({"gemini-2.5-flash": {"latency": 0.3}}, hedge=True, min_hedge_delay=0.05)
+    started = time.monotonic()
+    assert ask(router.for_task("paper_summary")).model.id == "gemini-2.5-pro"
+    assert time.monotonic() - started < 0.25
+
+
+def test_no_hedge_while_the_call_is_within_its_usual_latency():
+    router = make_router({"gemini-2.5-flash": {"latency": 0.05}}, hedge=True, min_hedge_delay=0.5)
+    assert ask(router.for_task("paper_summary")).model.id == "gemini-2.5-flash"
+    assert router.snapshot()["gemini-2.5-pro"]["calls"] == 0
+
+
+def test_failing_model_is_tried_last_until_its_cooldown_ends():
+    router = make_router({"gemini-2.5-flash": {"fail_first": 1}}, alpha=1.0, cooldown=0.1)
+    ask(router.for_task("paper_summary"))
+    assert [model.id for model in router.candidates("paper_summary")] == [
+        "gemini-2.5-pro", "gemini-2.5-flash-lite", "gemini-2.5-flash"
+    ]
+    time.sleep(0.15)
+    assert router.candidates("paper_summary")[0].id == "gemini-2.5-flash"
+
+
+def test_error_ewma_decays_with_successes():
+    router = make_router({"gemini-2.5-flash": {"fail_first": 1}}, alpha=0.5, cooldown=0.0)
+    ask(router.for_task("paper_summary"))
+    assert router.snapshot()["gemini-2.5-flash"]["error_ewma"] == 0.5
+    ask(router.for_task("paper_summary"))
+    assert router.snapshot()["gemini-2.5-flash"]["error_ewma"] == 0.25
+
+
+def test_stream_fails_over_before_the_first_chunk():
+    router = make_router({"gemini-2.5-flash": {"fail_first": 1}})
+    chunks = list(router.for_task("paper_summary").invoke_stream(messages=[Message(role="user", content="Hi")]))
+    assert [(chunk.model.id, chunk.raw) for chunk in chunks] == [("gemini-2.5-pro", "Mock response.")]
+
+
+def test_stream_errors_after_the_first_chunk_are_not_retried():
+    class BrokenStream(MockModel):
+        def invoke_stream(self, **kwargs):
+            yield "partial"
+            raise self._failure()
+
+    router = ModelRouter(model_factory=lambda model_id: BrokenStream(id=model_id))
+    stream = router.for_task("paper_summary").invoke_stream(messages=[Message(role="user", content="Hi")])
+    assert next(stream).raw == "partial"
+    with pytest.raises(ModelProviderError):
+        next(stream)
+    assert router.snapshot()["gemini-2.5-pro"]["calls"] == 0
+
+
+def test_time_queued_for_a_worker_is_not_charged_to_the_model():
+    router = make_router({model_id: {"latency": 0.2} for model_id in MODEL_TIERS}, timeout=0.3, max_workers=2)
+    routed = router.for_task("paper_summary")
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        answers = list(pool.map(lambda _: ask(routed).model.id, range(8)))
+    assert answers == ["gemini-2.5-flash"] * 8
+    assert all(stats["failures"] == 0 for stats in router.snapshot().values())
+
+
+def test_summary_fan_out_is_limited_by_the_router_pool():
+    router = make_router(max_workers=4)
+    tools = DedupPubmedTools(summary_model=router.for_task("paper_summary"))
+    assert tools.max_summary_workers == 2
@@ -0,0 +1,136 @@
+import json
+
+import pytest
+
+from model_router import MockModel
+from pubmed_dedup import DedupPubmedTools, collapse_studies, normalize_title, titles_match
+from run_context import RunContext, bound_run
+
+
+def record(pmid, title, publication_types=("Journal Article",), relations=(), abstract="Abstract.", year=2020):
+    return {
+        "pmid": pmid,
+        "title": title,
+        "publication_types": list(publication_types),
+        "relations": [{"type": ref_type, "pmid": target} for ref_type, target in relations],
+        "abstract": abstract,
+        "year": year,
+    }
+
+
+def by_pmid(studies):
+    return {study["pmid"]: study["related_pmids"] for study in studies}
+
+
+def test_erratum_collapses_into_its_study():
+    records = {
+        "1": record("1", "Ashwagandha for anxiety: a randomized trial", ["Randomized Controlled Trial"]),
+        "2": record("2", "Erratum", ["Published Erratum"], relations=[("ErratumFor", "1")], abstract=""),
+        "3": record("3", "Turmeric in knee osteoarthritis"),
+    }
+    assert by_pmid(collapse_studies(records)) == {"1": ["2"], "3": []}
+
+
+def test_satellite_citing_several_trials_does_not_merge_them():
+    records = {
+        "1": record("1", "Ashwagandha for anxiety: a randomized trial", ["Randomized Controlled Trial"]),
+        "2": record("2", "Brahmi for memory in older adults", ["Randomized Controlled Trial"]),
+        "3": record("3", "Two trials of Ayurvedic herbs", ["Editorial"],
+                    relations=[("CommentOn", "1"), ("CommentOn", "2")]),
+    }
+    assert by_pmid(collapse_studies(records)) == {"1": ["3"], "2": []}
+
+
+def test_republished_primary_articles_are_one_study():
+    records = {
+        "1": record("1", "Triphala and gut microbiota", year=2018),
+        "2": record("2", "Triphala and the gut microbiome in adults", relations=[("RepublishedFrom", "1")], year=2019),
+    }
+    assert by_pmid(collapse_studies(records)) == {"1": ["2"]}
+
+
+def test_satellite_without_primary_stands_alone():
+    records = {"5": record("5", "Letter on neem", ["Letter"], relations=[("CommentOn", "99")])}
+    assert by_pmid(collapse_studies(records)) == {"5": []}
+
+
+@pytest.mark.parametrize(
+    "first, second",
+    [
+        ("Type 1 diabetes and turmeric supplementation", "Type 2 diabetes and turmeric supplementation"),
+        ("Panchakarma outcomes in chronic arthritis: part I", "Panchakarma outcomes in chronic arthritis: part II"),
+        ("Ashwagandha for stress: an 8-week randomized trial", "Ashwagandha for stress: a 12-week randomized trial"),
+    ],
+)
+def test_titles_differing_in_numbers_do_not_match(first, second):
+    assert not titles_match(normalize_title(first), normalize_title(second))
+
+
+def test_near_identical_titles_match():
+    assert titles_match(
+        normalize_title("Ashwagandha root extract for chronic stress: a randomized trial."),
+        normalize_title("Ashwagandha root extract for chronic stress - a randomised trial"),
+    )
+
+
+def test_title_numbers_block_merging_studies():
+    records = {
+        "1": record("1", "Type 1 diabetes and turmeric supplementation"),
+        "2": record("2", "Type 2 diabetes and turmeric supplementation"),
+    }
+    assert by_pmid(collapse_studies(records)) == {"1": [], "2": []}
+
+
+def test_expand_keywords_parses_one_query_per_line():
+    tools = DedupPubmedTools(keyword_model=MockModel(reply="1. ashwagandha anxiety\n- withania somnifera AND stress\n\n"))
+    assert json.loads(tools.expand_keywords("Does ashwagandha help anxiety?")) == [
+        "ashwagandha anxiety", "withania somnifera AND stress"
+    ]
+
+
+def test_expand_keywords_falls_back_to_the_question():
+    tools = DedupPubmedTools(keyword_model=MockModel(fail_first=1))
+    assert json.loads(tools.expand_keywords("ashwagandha anxiety")) == ["ashwagandha anxiety"]
+
+
+def test_summaries_are_made_once_and_skip_failed_calls():
+    tools = DedupPubmedTools(summary_model=MockModel(reply="Short summary.", fail_first=1))
+    records = [record("1", "Trial one"), record("2", "Trial two")]
+    tools.summarize_records(records)
+    assert sorted(r.get("summary", "") for r in records) == ["", "Short summary."]
+    tools.summarize_records(records)
+    assert [r["summary"] for r in records] == ["Short summary.", "Short summary."]
+    assert tools.summary_model._calls == 3
+
+
+def test_near_duplicate_titles_with_different_first_words_collapse():
+    records = {
+        "1": record("1", "Effect of ashwagandha root extract on stress and anxiety in adults: a randomized trial"),
+        "2": record("2", "Effects of ashwagandha root extract on stress and anxiety in adults: a randomized trial"),
+        "3": record("3", "The effect of ashwagandha root extract on stress and anxiety in adults: a randomized trial"),
+    }
+    assert by_pmid(collapse_studies(records)) == {"1": ["2", "3"]}
+
+
+def test_studies_returned_earlier_in_the_run_are_shortened():
+    class StubTools(DedupPubmedTools):
+        def fetch_pmids(self, query, limit):
+            return {"ashwagandha": ["1", "2"], "withania": ["2", "3"]}[query]
+
+        def fetch_records(self, pmids):
+            records = {pmid: record(pmid, f"Study {pmid} of ashwagandha") for pmid in pmids}
+            for item in records.values():
+                item["evidence"] = {"score": 50.0, "grade": "moderate", "design": "other", "population": "human",
+                                    "sample_size": None, "year": 2020}
+            return records
+
+    tools = StubTools()
+    with bound_run(RunContext()):
+        tools.search_pubmed(["ashwagandha"])
+        second = {study["pmid"]: study for study in json.loads(tools.search_pubmed(["withania"]))["studies"]}
+    assert second["2"] == {"pmid": "2", "title": "Study 2 of ashwagandha", "evidence": second["2"]["evidence"],
+                           "returned_earlier": True}
+    assert second["3"]["abstract"] and "returned_earlier" not in second["3"]
+    # A new run gets every study in full again
+    with bound_run(RunContext()):
+        assert "returned_earlier" not in tools.search_pubmed(["withania"])
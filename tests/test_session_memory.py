@@ -0,0 +1,149 @@
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from evidence import score_corpus
+from model_router import MockModel
+from pubmed_dedup import DedupPubmedTools
+from run_context import RunContext, RunScopedAgent, bound_run
+from session_memory import SessionMemoryTools, SessionStore
+
+
+def record(pmid, title, abstract, mesh_terms=("Humans",)):
+    return {
+        "pmid": pmid,
+        "title": title,
+        "publication_types": ["Randomized Controlled Trial"],
+        "mesh_terms": list(mesh_terms),
+        "relations": [],
+        "abstract": abstract,
+        "year": 2020,
+    }
+
+
+def session_with(store, records):
+    for item, evidence in zip(records, score_corpus(records, current_year=2024)):
+        item["evidence"] = evidence
+    store.get("s1").add_records({item["pmid"]: item for item in records})
+
+
+def recall(tools, topic=None):
+    return json.loads(tools.recall_session_papers(SimpleNamespace(session_id="s1"), topic=topic))
+
+
+def test_recall_returns_capped_entries_with_summaries():
+    store = SessionStore()
+    records = [record(str(i), f"Ashwagandha trial {i}", "Long abstract with 300 mg doses. " * 40) for i in range(1, 6)]
+    records[0]["summary"] = "300 mg twice daily for 8 weeks."
+    session_with(store, records)
+    result = recall(SessionMemoryTools(store, max_studies=3))
+    assert result["total_studies"] == 5
+    assert len(result["studies"]) == 3
+    entries = {study["pmid"]: study for study in result["studies"]}
+    assert set(entries["1"]) == {"pmid", "title", "evidence", "summary"}
+    assert entries["1"]["summary"] == "300 mg twice daily for 8 weeks."
+    assert all("abstract" in study for pmid, study in entries.items() if pmid != "1")
+
+
+def test_recall_topic_matches_every_word():
+    store = SessionStore()
+    session_with(store, [
+        record("1", "Ashwagandha for anxiety", "Withania somnifera 300 mg reduced stress."),
+        record("2", "Turmeric in knee osteoarthritis", "Curcumin improved pain.", ["Humans", "Osteoarthritis, Knee"]),
+        record("3", "Ashwagandha and sleep", "Improved sleep onset."),
+    ])
+    tools = SessionMemoryTools(store)
+    assert [s["pmid"] for s in recall(tools, "ashwagandha stress")["studies"]] == ["1"]
+    assert [s["pmid"] for s in recall(tools, "osteoarthritis")["studies"]] == ["2"]
+
+
+def test_store_evicts_least_recently_used_sessions():
+    store = SessionStore(max_sessions=2)
+    first = store.get("a")
+    store.get("b")
+    store.get("a")
+    store.get("c")
+    assert len(store) == 2
+    assert store.get("a") is first
+
+
+def test_store_evicts_idle_sessions():
+    store = SessionStore(ttl=0.05)
+    first = store.get("a")
+    time.sleep(0.1)
+    store.get("b")
+    assert len(store) == 1
+    assert store.get("a") is not first
+
+
+class StubPubmedTools(DedupPubmedTools):
+    """Serves fixed PMIDs per query and records which PMIDs were fetched."""
+
+    def __init__(self, results, **kwargs):
+        super().__init__(**kwargs)
+        self.results = results
+        self.fetched = []
+
+    def fetch_pmids(self, query, limit):
+        return self.results[query][:limit]
+
+    def fetch_records(self, pmids):
+        self.fetched.append(list(pmids))
+        records = [record(pmid, f"Study {pmid} of an Ayurvedic herb", f"We randomized {pmid} adults.") for pmid in pmids]
+        for item, evidence in zip(records, score_corpus(records, current_year=2024)):
+            item["evidence"] = evidence
+        return {item["pmid"]: item for item in records}
+
+
+def search(tools, queries, session_id="s1"):
+    return json.loads(tools.search_pubmed(queries, agent=SimpleNamespace(session_id=session_id)))
+
+
+def test_search_reuses_session_records_and_fetches_only_missing_pmids():
+    store = SessionStore()
+    tools = StubPubmedTools({"ashwagandha": ["11", "12"], "withania": ["12", "13"]}, session_store=store)
+    search(tools, ["ashwagandha"])
+    result = search(tools, ["withania"])
+    assert tools.fetched == [["11", "12"], ["13"]]
+    studies = {study["pmid"]: study for study in result["studies"]}
+    assert studies["12"].get("already_retrieved") and studies["12"]["abstract"]
+    assert not studies["13"].get("already_retrieved")
+    assert list(store.get("s1").records) == ["11", "12", "13"]
+    assert search(tools, ["ashwagandha"], session_id="s2") and tools.fetched[-1] == ["11", "12"]
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_concurrent_sessions_keep_their_own_papers(stream):
+    store = SessionStore()
+    tools = StubPubmedTools({"ashwagandha": ["21", "22"], "turmeric": ["31", "32"]}, session_store=store)
+    # The model answers each question by searching PubMed for it
+    model = MockModel(latency=0.05, tool_call="search_pubmed", tool_arguments=lambda message: {"queries": [message]})
+    agent = RunScopedAgent(model=model, tools=[tools, SessionMemoryTools(store)], telemetry=False)
+
+    async def run(question, session_id):
+        response = await agent.arun(question, session_id=session_id, stream=stream)
+        if stream:
+            async for _ in response:
+                await asyncio.sleep(0.01)
+
+    async def run_both():
+        await asyncio.gather(run("ashwagandha", "s-ash"), run("turmeric", "s-tur"))
+
+    asyncio.run(run_both())
+    assert sorted(store.get("s-ash").records) == ["21", "22"]
+    assert sorted(store.get("s-tur").records) == ["31", "32"]
+    assert store.get("s-ash").summary[0].startswith("ashwagandha ->")
+    assert store.get("s-tur").summary[0].startswith("turmeric ->")
+
+
+def test_recall_shortens_studies_already_returned_in_the_run():
+    store = SessionStore()
+    session_with(store, [record("1", "Ashwagandha for anxiety", "Withania somnifera 300 mg reduced stress.")])
+    tools = SessionMemoryTools(store)
+    with bound_run(RunContext(session_id="s1")):
+        first = json.loads(tools.recall_session_papers(None))["studies"][0]
+        second = json.loads(tools.recall_session_papers(None))["studies"][0]
+    assert "abstract" in first and second["returned_earlier"] and "abstract" not in second